@@ -70,7 +70,7 @@ tasks {
 
     register<Delete>("cleanLogs") {
         delete(fileTree("logs") {
-            include("*.db", "*.log", "*.lp", "*.yaml")
+            include("*.db", "*.log", "*.json", "*.lp", "*.yaml")
         })
     }
 
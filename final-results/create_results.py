@@ -2,108 +2,125 @@ from db_connector import DataBase
 from queries import *
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import math
+import concurrent.futures
 import os
- 
+import shutil
+import subprocess
 
-db = DataBase('results.db')
+
+USE_TEX = os.environ.get('FINAL_PLOTS') == '1'
 num_targets = [21, 32, 33, 64]
 num_discretizations = [2, 4, 6]
-result_category = ['optimal', 'infeasible', 'timed-out']
+COL_NAMES = {d: {name: '{}_{}'.format(name, d) for name in ['time', 'rub', 'rlb', 'opt', 'nodes']}
+             for d in num_discretizations}
+result_category = ['opt', 'infeas', 'to']
+
+# plot setup
+plt.rc('font',**{'family':'serif','serif':['Palatino']})
+plt.rc('text', usetex=USE_TEX)
+
+
+def finalize_pdf(name, folder='plots'):
+    """Crop the given pdf with pdfcrop and move the cropped file into folder"""
+    cropped_name = name.replace('.pdf', '-crop.pdf')
+    subprocess.run(['pdfcrop', name, cropped_name], check=True, capture_output=True)
+    shutil.move(cropped_name, os.path.join(folder, name))
+    os.remove(name)
+
+
+def build_report(db, table='exhaustive', categories=result_category, targets=num_targets, out_prefix='full'):
+    """Write the result count table and per-target result tables for an exhaustive-style table"""
+    if not targets:
+        return
+    view = db.add_lookup_view(table)
+
+    query, params = generate_exhaustive_table_count_query(targets, view)
+    df = db.get_dataframe(query, params)
+    counts = df.pivot_table(index='num_targets', columns=['d', 'category'], values='cnt', aggfunc='sum', fill_value=0)
+    count_columns = pd.MultiIndex.from_tuples([(d, c) for d in num_discretizations for c in categories])
+    counts = counts.reindex(index=targets, columns=count_columns, fill_value=0)
+    counts.columns = ['{}_{}'.format(c, d) for d, c in counts.columns]
+    counts_df = counts.rename_axis('num_targets').reset_index()
+    counts_df.to_csv('csv/{}_counts.csv'.format(table), index=False)
 
-row_list = []
-for t in num_targets:
-    row = [t]
-    for d in num_discretizations:
-        for c in result_category:
-            query = generate_exhaustive_table_count_query(category=c, num_targets=t, num_discretizations=d)
-            results = db.execute_query(query)
-            row.append(results[0][0])
-    row_list.append(row)
+    def process_target(t):
+        query = generate_exhaustive_opt_table_query(t, num_discretizations, view)
+        df = db.get_dataframe(query)
+        rlb_cols = [c for c in df.columns if 'rlb' in c]
+        for d in num_discretizations:
+            cn = COL_NAMES[d]
+            time_arr, rub_arr, rlb_arr, opt_arr = (df[cn[c]].to_numpy(copy=True) for c in
+                                                   ('time', 'rub', 'rlb', 'opt'))
+            np.minimum(time_arr, 3600.00, out=time_arr)
+            bad = rlb_arr == 0.0
+            rub_arr[bad | (rub_arr == 0.0)] = np.nan
+            rlb_arr[bad] = np.nan
+            opt_arr[bad] = np.nan
+            df[cn['time']] = time_arr
+            df[cn['rub']] = rub_arr
+            df[cn['rlb']] = rlb_arr
+            df[cn['opt']] = opt_arr
+        df.drop(columns=rlb_cols, inplace=True)
+        df['instance_name'] = df['instance_name'].str.removesuffix('.txt')
+        df.to_csv('csv/{}_{}.csv'.format(out_prefix, t), float_format='%.2f', na_rep='--', index=False)
 
-exhaustive_df = pd.DataFrame(row_list, columns=['num_targets', 'opt_2', 'infeas_2', 'to_2', 'opt_4', 'infeas_4', 'to_4', 'opt_6', 'infeas_6', 'to_6'])
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(targets))) as executor:
+            list(executor.map(process_target, targets))
+    finally:
+        db.close_thread_connections()
 
-exhaustive_df.to_csv('csv/exhaustive_counts.csv', index=False)
 
-for t in num_targets:
-    query = generate_exhaustive_opt_table_query(t)
+def build_idssr_table(db):
+    query = generate_idssr_query()
     df = db.get_dataframe(query)
-    columns = df.columns
-    for column in columns:
-        if ('nodes' in column):
-            df[column] = df[column].apply(pd.to_numeric, downcast='integer').fillna(0)
+    df['instance_name'] = df['instance_name'].str.removesuffix('.txt')
+    for column in df.columns:
         if (column == 'instance_name'):
-            continue 
-        else:
-            df[column] = df[column].apply(pd.to_numeric, downcast='float').fillna(0)
-    for d in num_discretizations:
-        time_col_name = 'time_{}'.format(d)
-        rub_col_name = 'rub_{}'.format(d)
-        rlb_col_name = 'rlb_{}'.format(d)
-        opt_col_name = 'opt_{}'.format(d)
-        nodes_col_name = 'nodes_{}'.format(d)
-        index_list = df.query('time_{} > 3600.00'.format(d)).index
-        df.loc[index_list, time_col_name] = 3600.00
-        df.loc[(df[rub_col_name] == 0.0), rub_col_name] = np.nan
-        index_list = df.query('rlb_{} == 0.00'.format(d)).index
-        df.loc[index_list, rub_col_name] = np.nan
-        df.loc[index_list, rlb_col_name] = np.nan
-        df.loc[index_list, opt_col_name] = np.nan
-    for column in columns:
-        if ('rlb' in column):
+            continue
+        if ('opt' in column):
             del df[column]
-            continue 
-        if (column == 'instance_name' or 'nodes' in column):
-            continue 
-        else:
-            df[column] = df[column].apply(pd.to_numeric, downcast='float')
-    df['instance_name'] = df['instance_name'].str.replace(r'.txt$', '')
-    df.to_csv('csv/full_{}.csv'.format(t), float_format='%.2f', na_rep='--', index=False)
-
-query = generate_idssr_query()
-df = db.get_dataframe(query)
-df['instance_name'] = df['instance_name'].str.replace(r'.txt$', '')
-for column in df.columns:
-    if (column == 'instance_name'): 
-        continue
-    if ('opt' in column):
-        del df[column]
-        continue
-    df[column] = df[column].apply(pd.to_numeric, downcast='float')
-df['improvement_factor'] = (df['simple_time']-df['one_thread_time'])/df['simple_time']*100.00
-index_list = df.query('simple_time > 3600.00').index
-df.loc[index_list, 'simple_time'] = 3600.00
-df.loc[index_list, 'improvement_factor'] = np.nan
-print('mean improvement factor for I-DSSR = {}'.format(df['improvement_factor'].mean()))
-df.to_csv('csv/idssr.csv', float_format='%.2f', na_rep='--', index=False)
-
-query = generate_concurrency_query()
-df = db.get_dataframe(query)
-df['instance_name'] = df['instance_name'].str.replace(r'.txt$', '')
-for column in df.columns:
-    if (column == 'instance_name'): 
-        continue
-    if ('opt' in column):
-        del df[column]
-        continue
-    if (column == 'num_targets'):
-        df[column] = df[column].apply(pd.to_numeric, downcast='integer')
-        continue
-    df[column] = df[column].apply(pd.to_numeric, downcast='float')
-df['improvement_factor'] = (df['one_thread_time']-df['concurrent_time'])/df['one_thread_time']*100.00
-hist_values = list(df['improvement_factor'].values)
-avg_improvement = df['improvement_factor'].mean()
-num_bins = math.ceil((max(hist_values)-min(hist_values))/1.5)
-bins = np.linspace(min(hist_values), max(hist_values), num_bins)
-# plot setup
-plt.rc('font',**{'family':'serif','serif':['Palatino']})
-plt.rc('text', usetex=True)
-fig, ax = plt.subplots(figsize=(3.5,5))
-ax.set_xlabel(r'Relative run time improvement (\%)', fontsize=10)
-ax.hist(hist_values, bins=23, density=False, alpha=0.5, edgecolor='black', color='#00AFBB', label=r'$|T|=70$')
-plt.figtext(0.5, 0.8, 'Average = {:.2f}\%'.format(avg_improvement), fontsize=10)
-plt.savefig('concurrency_histogram.pdf', format='pdf')
-crop_cmd = 'pdfcrop concurrency_histogram.pdf; mv -f concurrency_histogram-crop.pdf concurrency_histogram.pdf'
-os.system(crop_cmd)
-os.system('mv -f concurrency_histogram.pdf plots/concurrency_histogram.pdf')
+            continue
+        df[column] = pd.to_numeric(df[column], errors='coerce', downcast='float')
+    df['improvement_factor'] = (df['simple_time']-df['one_thread_time'])/df['simple_time']*100.00
+    timed_out = df['simple_time'].to_numpy() > 3600.00
+    df.loc[timed_out, ['simple_time', 'improvement_factor']] = [3600.00, np.nan]
+    print('mean improvement factor for I-DSSR = {}'.format(df['improvement_factor'].mean()))
+    df.to_csv('csv/idssr.csv', float_format='%.2f', na_rep='--', index=False)
+
+
+def build_concurrency_histogram(db):
+    query = generate_concurrency_query()
+    df = db.get_dataframe(query)
+    df['instance_name'] = df['instance_name'].str.removesuffix('.txt')
+    df['num_targets'] = df.pop('instance_path').str.slice(11, 13).astype('int32')
+    df = df[df['num_targets'] != 66].reset_index(drop=True)
+    for column in df.columns:
+        if (column == 'instance_name' or column == 'num_targets'):
+            continue
+        if ('opt' in column):
+            del df[column]
+            continue
+        df[column] = pd.to_numeric(df[column], errors='coerce', downcast='float')
+    one_thread_time = df['one_thread_time'].to_numpy()
+    concurrent_time = df['concurrent_time'].to_numpy()
+    df['improvement_factor'] = (one_thread_time-concurrent_time)/one_thread_time*100.00
+    hist_values = df['improvement_factor'].to_numpy()
+    avg_improvement = hist_values.mean()
+    percent = r'\%' if USE_TEX else '%'
+    fig, ax = plt.subplots(figsize=(3.5,5))
+    ax.set_xlabel('Relative run time improvement ({})'.format(percent), fontsize=10)
+    ax.hist(hist_values, bins=23, density=False, alpha=0.5, edgecolor='black', color='#00AFBB', label=r'$|T|=70$')
+    plt.figtext(0.5, 0.8, 'Average = {:.2f}{}'.format(avg_improvement, percent), fontsize=10)
+    plt.savefig('concurrency_histogram.pdf', format='pdf')
+    finalize_pdf('concurrency_histogram.pdf')
+
+
+if __name__ == '__main__':
+    db = DataBase('results.db')
+    build_report(db, 'exhaustive')
+    build_idssr_table(db)
+    build_concurrency_histogram(db)
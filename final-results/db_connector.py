@@ -1,24 +1,132 @@
+import hashlib
+import os
 import sqlite3
+import tempfile
+import threading
 from sqlite3 import Error
 import pandas as pd
 
 class DataBase:
     """Class to hold a database and execute queries on it"""
-    def __init__(self, db_file):
-        self.connection = None
+    def __init__(self, db_file, cache_dir='cache'):
+        self.db_file = db_file
+        self.cache_dir = cache_dir
+        # sqlite connections cannot be shared across threads, so each thread opens its own
+        self._local = threading.local()
+        # tables with a lookup view, recreated on every new connection since temp views are per connection
+        self._lookup_tables = set()
+        # stamp of the db contents the cache folder was last pruned for
+        self._pruned_stamp = None
+        # every per-thread connection, so that those of worker threads can be closed once they are done
+        self._connections = []
+        self._connections_lock = threading.Lock()
         try:
-            self.connection = sqlite3.connect(db_file)
+            self._connect()
         except Error as e:
             print(e)
-            
-    def execute_query(self, query):
-        current = self.connection.cursor()
-        current.execute(query)
-        return current.fetchall()
-    
+
+    def _connect(self):
+        """Open the connection of the calling thread"""
+        # each connection is only used by its own thread, the check is lifted so another thread can close it
+        connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        connection.executescript("""
+            pragma synchronous=NORMAL;
+            pragma cache_size=-65536;
+            pragma mmap_size=268435456;
+            pragma temp_store=MEMORY;
+            """)
+        for table in self._lookup_tables:
+            self._create_lookup_view(connection, table)
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+        return connection
+
+    def close_thread_connections(self):
+        """Close the connections opened by threads other than the calling one"""
+        own = getattr(self._local, 'connection', None)
+        with self._connections_lock:
+            others = [c for c in self._connections if c is not own]
+            self._connections = [c for c in self._connections if c is own]
+        for connection in others:
+            connection.close()
+
+    @property
+    def cursor(self):
+        if getattr(self._local, 'cursor', None) is None:
+            self._local.cursor = self.connection.cursor()
+        return self._local.cursor
+
+    def add_lookup_view(self, table):
+        """Return a temp view over a results table with typed num_disc/num_targets columns, leaving the db untouched"""
+        self._lookup_tables.add(table)
+        self._create_lookup_view(self.connection, table)
+        return '{}_lookup'.format(table)
+
+    @staticmethod
+    def _create_lookup_view(connection, table):
+        connection.execute('create temp view if not exists {0}_lookup as select *, '
+                           'cast(number_of_discretizations as integer) as num_disc, '
+                           'cast(substr(instance_path, 12, 2) as integer) as num_targets '
+                           'from {0}'.format(table))
+
+    def execute_query(self, query, params=()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
     def count_entries(self, query):
         rows = self.execute_query(query)
         return len(rows)
 
-    def get_dataframe(self, query):
-        return pd.read_sql_query(query, self.connection)
\ No newline at end of file
+    def get_dataframe(self, query, params=(), force=False):
+        """Return query results, reusing a parquet copy cached for the current db file"""
+        query_hash = hashlib.blake2b((query + repr(tuple(params))).encode()).hexdigest()[:16]
+        cache_path = os.path.join(self.cache_dir, '{}_{}.parquet'.format(query_hash, self._cache_stamp()))
+        if not force and os.path.isfile(cache_path):
+            try:
+                return pd.read_parquet(cache_path, dtype_backend='pyarrow')
+            except (OSError, ValueError) as e:
+                print('rerunning query, unable to read cached {}: {}'.format(cache_path, e))
+        df = pd.read_sql_query(query, self.connection, params=params, dtype_backend='pyarrow')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # written under a temporary name first, so an interrupted write never leaves a truncated cache file
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                df.to_parquet(fout, index=False)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return df
+
+    def _cache_stamp(self):
+        """Identify the db contents by mtime and size of the db and its WAL file, pruning stale cache files"""
+        st = os.stat(self.db_file)
+        parts = [st.st_mtime_ns, st.st_size]
+        if os.path.isfile(self.db_file + '-wal'):
+            st = os.stat(self.db_file + '-wal')
+            parts += [st.st_mtime_ns, st.st_size]
+        stamp = hashlib.blake2b(repr(parts).encode()).hexdigest()[:16]
+        if stamp != self._pruned_stamp:
+            self._prune_cache(stamp)
+            self._pruned_stamp = stamp
+        return stamp
+
+    def _prune_cache(self, stamp):
+        if not os.path.isdir(self.cache_dir):
+            return
+        suffix = '_{}.parquet'.format(stamp)
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.parquet') and not entry.name.endswith(suffix):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass  # already pruned by another thread
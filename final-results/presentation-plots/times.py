@@ -1,10 +1,14 @@
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import csv
+import pandas as pd
 import math
 import statistics
 import os
 
+USE_TEX = os.environ.get('FINAL_PLOTS') == '1'
+
 def set_box_color(bp, color, ls):
     plt.setp(bp['boxes'], color='black', ls=ls, lw=1)
     plt.setp(bp['whiskers'], color='black', lw=1)
@@ -13,26 +17,23 @@ def set_box_color(bp, color, ls):
     for patch, c in zip(bp['boxes'], color):
         patch.set_facecolor(color)
 
-f = open('threading.csv', 'r')
-reader = csv.reader(f)
-rows = []
-for row in reader:
-    rows.append(row)
-
-times = {i : [] for i in range(0, 3)}
-
-for i in range(1, len(rows)):
-    times[0].append(float(rows[i][0]))
-    times[1].append(float(rows[i][1]))
-    times[2].append(float(rows[i][2]))
-
-to_plot = [times[0], times[1], times[2]]
-labels = [r'\begin{center} \noindent Single-threaded\\ \noindent B\&P with DSSR \end{center}', 
-          r'\begin{center} \noindent Single-threaded\\ \noindent B\&P with I-DSSR \end{center}', 
-          r'\begin{center} \noindent Multi-threaded\\ B\&P with I-DSSR \end{center}']
+def geometric_bins(values, multiplier=1.2):
+    low, high = np.min(values), np.max(values)
+    num_steps = int(np.ceil(np.log(high / low) / np.log(multiplier)))
+    return np.geomspace(low, low * multiplier ** num_steps, num_steps + 1)
+
+to_plot = pd.read_csv('threading.csv', dtype=np.float64).to_numpy()
+if USE_TEX:
+    labels = [r'\begin{center} \noindent Single-threaded\\ \noindent B\&P with DSSR \end{center}', 
+              r'\begin{center} \noindent Single-threaded\\ \noindent B\&P with I-DSSR \end{center}', 
+              r'\begin{center} \noindent Multi-threaded\\ B\&P with I-DSSR \end{center}']
+else:
+    labels = ['Single-threaded\nB&P with DSSR',
+              'Single-threaded\nB&P with I-DSSR',
+              'Multi-threaded\nB&P with I-DSSR']
 
 plt.rc('font',**{'family':'serif','serif':['Palatino']})
-plt.rc('text', usetex=True)
+plt.rc('text', usetex=USE_TEX)
 plt.style.use('seaborn-paper')
 
 fig, ax = plt.subplots(figsize=(4,5))
@@ -48,39 +49,14 @@ ax.xaxis.set_ticks_position('none')
 plt.savefig('threading_comparison_bar.pdf', format='pdf')
 
 
-f = open('dominance.csv', 'r')
-reader = csv.reader(f)
-rows = []
-for row in reader:
-    rows.append(row)
-
-strict_times = []
-relaxed_times = []
-
-for i in range(1, len(rows)):
-    strict_times.append(float(rows[i][0]))
-    relaxed_times.append(float(rows[i][1]))
-    
-bins = [np.min(strict_times)]
-cur_value = bins[0]
-multiplier = 1.2
-while cur_value < np.max(strict_times):
-    cur_value = cur_value * multiplier
-    bins.append(cur_value)
-bins = np.array(bins)
+times = pd.read_csv('dominance.csv', dtype=np.float64).to_numpy()
+strict_times = times[:, 0]
+relaxed_times = times[:, 1]
 
 fig, ax = plt.subplots()
-n, bins, patches = plt.hist(strict_times, bins=bins, density=True, alpha=0.5, edgecolor='black', color='blue', facecolor='g')
-
-bins = [np.min(relaxed_times)]
-cur_value = bins[0]
-multiplier = 1.2
-while cur_value < np.max(strict_times):
-    cur_value = cur_value * multiplier
-    bins.append(cur_value)
-bins = np.array(bins)
+n, bins, patches = plt.hist(strict_times, bins=geometric_bins(strict_times), density=True, alpha=0.5, edgecolor='black', color='blue', facecolor='g')
 
-n, bins, patches = plt.hist(strict_times, bins=bins, density=True, alpha=0.5, edgecolor='black', color='blue', facecolor='b')
+n, bins, patches = plt.hist(relaxed_times, bins=geometric_bins(relaxed_times), density=True, alpha=0.5, edgecolor='black', color='blue', facecolor='b')
 
 
 ax.set_xscale('log')
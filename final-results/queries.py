@@ -1,50 +1,44 @@
-def generate_exhaustive_table_count_query(category='optimal', num_targets=21, num_discretizations=2):
-    query = 'select count(*) from exhaustive where '
-    query += 'cast(number_of_discretizations as integer) = {} and '.format(num_discretizations)
-    query += 'instance_path like "%{}%" and '.format(num_targets)
-    if category == 'optimal':
-        query += 'optimality_reached = "True" and cast(root_lower_bound as decimal(16,2)) > 0.0'
-    if category == 'infeasible':
-        query += 'optimality_reached = "True" and cast(root_lower_bound as decimal(16,2)) = 0.0'
-    if category == 'timed-out':
-        query += 'optimality_reached = "False"'
-    return query
+def generate_exhaustive_table_count_query(num_targets=[21, 32, 33, 64], table='exhaustive'):
+    return """
+        select
+            num_targets,
+            num_disc as d,
+            case
+                when optimality_reached = "True" and cast(root_lower_bound as decimal(16,2)) > 0.0 then 'opt'
+                when optimality_reached = "True" and cast(root_lower_bound as decimal(16,2)) = 0.0 then 'infeas'
+                when optimality_reached = "False" then 'to'
+            end as category,
+            count(*) as cnt
+        from {}
+        where num_targets in ({})
+        group by num_targets, d, category
+        """.format(table, ', '.join('?' * len(num_targets))), tuple(num_targets)
 
-def generate_exhaustive_opt_table_query(num_targets=21, discretizations=[2, 4, 6]):
+def generate_exhaustive_opt_table_query(num_targets=21, discretizations=[2, 4, 6], table='exhaustive'):
+    columns = []
+    for d in discretizations:
+        columns += [
+            'max(case when num_disc = {0} then round(root_upper_bound, 2) end) as rub_{0}'.format(d),
+            'max(case when num_disc = {0} then round(final_lower_bound, 2) end) as opt_{0}'.format(d),
+            'max(case when num_disc = {0} then cast(number_of_nodes_solved as integer) end) as nodes_{0}'.format(d),
+            'max(case when num_disc = {0} then round(solution_time_in_seconds, 2) end) as time_{0}'.format(d),
+            'max(case when num_disc = {0} then round(root_lower_bound, 2) end) as rlb_{0}'.format(d),
+        ]
     return """
         select 
-	        ex_1.instance_name, 
-            printf("%.2f", ex_1.root_upper_bound) as rub_2,
-            printf("%.2f", ex_1.final_lower_bound) as opt_2,
-            printf("%d", ex_1.number_of_nodes_solved) as nodes_2,
-            printf("%.2f", ex_1.solution_time_in_seconds) as time_2,
-            printf("%.2f", ex_1.root_lower_bound) as rlb_2,
-            printf("%.2f", ex_2.root_upper_bound) as rub_4,
-            printf("%.2f", ex_2.final_lower_bound) as opt_4,
-            printf("%d", ex_2.number_of_nodes_solved) as nodes_4,
-            printf("%.2f", ex_2.solution_time_in_seconds) as time_4,
-            printf("%.2f", ex_2.root_lower_bound) as rlb_4,
-            printf("%.2f", ex_3.root_upper_bound) as rub_6,
-            printf("%.2f", ex_3.final_lower_bound) as opt_6,
-            printf("%d", ex_3.number_of_nodes_solved) as nodes_6,
-            printf("%.2f", ex_3.solution_time_in_seconds) as time_6,
-            printf("%.2f", ex_3.root_lower_bound) as rlb_6
-        from exhaustive as ex_1
-        inner join exhaustive as ex_2
-        inner join exhaustive as ex_3
-        on ex_1.instance_name = ex_2.instance_name and ex_1.instance_name = ex_3.instance_name
+            instance_name, 
+            {0}
+        from {4}
         where
-            ( (ex_1.optimality_reached = "True" and cast(ex_1.root_lower_bound as decimal(16,2)) > 0.0) or
-            (ex_2.optimality_reached = "True" and cast(ex_2.root_lower_bound as decimal(16,2)) > 0.0) or 
-            (ex_3.optimality_reached = "True" and cast(ex_3.root_lower_bound as decimal(16,2)) > 0.0) ) and 
-            cast(ex_1.number_of_discretizations as integer) = {1} and 
-            ex_1.instance_path like "%{0}%" and 
-            cast(ex_2.number_of_discretizations as integer) = {2} and 
-            ex_2.instance_path like "%{0}%" and 
-            cast(ex_3.number_of_discretizations as integer) = {3} and 
-            ex_3.instance_path like "%{0}%"
-        order by ex_1.instance_name
-        """.format(num_targets, discretizations[0], discretizations[1], discretizations[2])
+            num_disc in ({1}) and 
+            num_targets = {2}
+        group by instance_name
+        having
+            count(distinct num_disc) = {3} and 
+            sum(case when optimality_reached = "True" and cast(root_lower_bound as decimal(16,2)) > 0.0 then 1 else 0 end) > 0
+        order by instance_name
+        """.format(',\n            '.join(columns), ', '.join(str(d) for d in discretizations),
+                   num_targets, len(discretizations), table)
 
 def generate_idssr_query():
     return """
@@ -70,7 +64,7 @@ def generate_concurrency_query():
     return """
         select
             exhaustive.instance_name,
-            cast(substr(exhaustive.instance_path, 12, 2) as integer) as num_targets,
+            exhaustive.instance_path,
             one_thread_interleaved.solution_time_in_seconds as one_thread_time,
             one_thread_interleaved.optimality_reached as one_thread_opt_reached,
             exhaustive.solution_time_in_seconds as concurrent_time,
@@ -85,7 +79,6 @@ def generate_concurrency_query():
         where 
             cast(one_thread_interleaved.number_of_nodes_solved as integer) > 1 and 
             one_thread_interleaved.optimality_reached = "True" and 
-			cast(substr(exhaustive.instance_path, 12, 2) as integer) != 66 and 
 			cast(one_thread_interleaved.solution_time_in_seconds as float) > 5.0
         order by
             one_thread_interleaved.instance_name
@@ -1,131 +1,126 @@
 import dubins
 import matplotlib.pyplot as plt
+import multiprocessing
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import numpy as np
 import pandas as pd
 from math import pi
 
-instance_info_filename = 'instance_info.csv'
-
-df = pd.read_csv(instance_info_filename)
-
-instance_name = df['instance_name'][0]
-num_targets = int(df['num_targets'][0])
-num_vehicles = int(df['num_vehicles'][0])
-turn_radius = float(df['turn_radius'][0])
-num_discretizations_1 = int(df['num_discretizations_1'][0])
-num_discretizations_2 = int(df['num_discretizations_2'][0])
-tmax = float(df['tmax'][0])
-
-print('instance name: {}'.format(instance_name))
-
-target_coordinates = []
-
-df = pd.read_csv(instance_name)
-for i in range(0, len(df)):
-    target_coordinates.append((df['x'][i], df['y'][i]))
-
-x_coords = [coord[0] for coord in target_coordinates]
-y_coords = [coord[1] for coord in target_coordinates]
-    
-h = 2.0 * pi / float(num_discretizations_1)
-discretizations = []
-for i in range(0, num_discretizations_1):
-    discretizations.append(float(i) * h)
-    
-target_of_vertex = {}
-num_vertices = num_targets * num_discretizations_1 
-vertices = [[0.0, 0.0, 0.0] for i in range(0, num_vertices)]
-for i in range(0, num_targets):
-    for j in range(0, num_discretizations_1):
-        target_of_vertex[i * num_discretizations_1 + j] = i 
-        vertices[i * num_discretizations_1 + j] = [target_coordinates[i][0], 
-                                                target_coordinates[i][1], 
-                                                discretizations[j]]
-        
-# plt.rc('font', family='sans-serif')
-## for Palatino and other serif fonts use:
-plt.rc('font',**{'family':'serif','serif':['Palatino']})
-plt.rc('text', usetex=True)
-
-fig, ax = plt.subplots(1, 2)
-plt.subplots_adjust(wspace=0.3, hspace=0.3)
-
-vehicles = list(range(1, num_vehicles+1)) 
-colors = ['chocolate', 'crimson', 'dimgray', 'orange']
-linestyles = ['solid', 'dotted', 'dashed', 'dashdot']
-
-
-for i in vehicles:
-    filename = 'vehicle_' + str(i) + '_1.csv'
-    df = pd.read_csv(filename)
-    vertex_path = list(df['vertex_path'].values)
-    path_x = []
-    path_y = []
-    for j in range(0, len(vertex_path)-1):
-        step_size = 0.5
-        s = vertex_path[j]
-        t = vertex_path[j+1]
-        q0 = tuple(vertices[s])
-        q1 = tuple(vertices[t])
-        path = dubins.shortest_path(q0, q1, turn_radius)
-        configurations, _ = path.sample_many(step_size)
-        path_x += [conf[0] for conf in configurations]
-        path_y += [conf[1] for conf in configurations]
-    ax[0].plot(path_x, path_y, color='black', linewidth=0.6, 
-            linestyle=linestyles[i-1], label=r'vehicle '+ str(i) + ' path')
-
-ax[0].tick_params(axis="x", direction="in", labelsize=8)
-ax[0].tick_params(axis="y", direction="in", labelsize=8)
-ax[0].plot(x_coords[1:-1], y_coords[1:-1], 'r.', markersize=3, label=r'target')
-ax[0].plot(x_coords[0], y_coords[0], 'b*', markersize=4, label=r'source')
-ax[0].plot(x_coords[-1], y_coords[-1], 'gx', markersize=4, label=r'destination')
-ax[0].legend(fontsize=8)
-ax[0].set_title(r'$|\Theta| = 6$', fontsize=10)
-
-h = 2.0 * pi / float(num_discretizations_2)
-discretizations = []
-for i in range(0, num_discretizations_2):
-    discretizations.append(float(i) * h)
-    
-target_of_vertex = {}
-num_vertices = num_targets * num_discretizations_2 
-vertices = [[0.0, 0.0, 0.0] for i in range(0, num_vertices)]
-for i in range(0, num_targets):
-    for j in range(0, num_discretizations_2):
-        target_of_vertex[i * num_discretizations_2 + j] = i 
-        vertices[i * num_discretizations_2 + j] = [target_coordinates[i][0], 
-                                                target_coordinates[i][1], 
-                                                discretizations[j]]
-        
-for i in vehicles:
-    filename = 'vehicle_' + str(i) + '_2.csv'
-    df = pd.read_csv(filename)
-    vertex_path = list(df['vertex_path'].values)
-    path_x = []
-    path_y = []
+
+def sample_dubins_path(q0, q1, turn_radius, step_size):
+    """Return the sampled (x, y, theta) configurations of the shortest dubins path from q0 to q1"""
+    configurations, _ = dubins.shortest_path(q0, q1, turn_radius).sample_many(step_size)
+    return np.asarray(configurations, dtype=np.float64).reshape(-1, 3)
+
+
+def build_vertices(target_coordinates, num_discretizations):
+    """Return a (num_targets * num_discretizations, 3) array of (x, y, heading) vertices, grouped by target"""
+    coordinates = np.asarray(target_coordinates, dtype=np.float64)
+    headings = np.arange(num_discretizations) * (2.0 * pi / float(num_discretizations))
+    vertices = np.empty((len(coordinates), num_discretizations, 3))
+    vertices[..., :2] = coordinates[:, None, :]
+    vertices[..., 2] = headings[None, :]
+    return vertices.reshape(-1, 3)
+
+
+def compute_vehicle_path(args):
+    """Return the x and y coordinates of the sampled path flown by a vehicle in the given solution"""
+    vehicle, solution, vertices, turn_radius = args
+    filename = 'vehicle_' + str(vehicle) + '_' + str(solution) + '.csv'
+    df = pd.read_csv(filename, usecols=['vertex_path'], dtype={'vertex_path': np.int64})
+    vertex_path = df['vertex_path'].to_numpy()
+    segs_x = []
+    segs_y = []
     for j in range(0, len(vertex_path)-1):
         step_size = 0.5
         s = vertex_path[j]
         t = vertex_path[j+1]
         q0 = tuple(vertices[s])
         q1 = tuple(vertices[t])
-        path = dubins.shortest_path(q0, q1, turn_radius)
-        configurations, _ = path.sample_many(step_size)
-        path_x += [conf[0] for conf in configurations]
-        path_y += [conf[1] for conf in configurations]
-    ax[1].plot(path_x, path_y, color='black', linewidth=0.6, 
-            linestyle=linestyles[i-1], label=r'vehicle '+ str(i) + ' path')
-
-ax[1].tick_params(axis="x", direction="in", labelsize=8)
-ax[1].tick_params(axis="y", direction="in", labelsize=8)
-ax[1].plot(x_coords[1:-1], y_coords[1:-1], 'r.', markersize=3, label=r'target')
-ax[1].plot(x_coords[0], y_coords[0], 'b*', markersize=4, label=r'source')
-ax[1].plot(x_coords[-1], y_coords[-1], 'gx', markersize=4, label=r'destination')
-ax[1].legend(fontsize=8)
-ax[1].set_title(r'$|\Theta| = 2$', fontsize=10)
-
-
-plt.savefig('illustration.pdf', format='pdf', bbox_inches='tight')
-
-
-
+        arr = sample_dubins_path(q0, q1, turn_radius, step_size)
+        segs_x.append(arr[:, 0])
+        segs_y.append(arr[:, 1])
+    path_x = np.concatenate(segs_x) if segs_x else np.empty(0)
+    path_y = np.concatenate(segs_y) if segs_y else np.empty(0)
+    return path_x, path_y
+
+
+def main():
+    instance_info_filename = 'instance_info.csv'
+
+    df = pd.read_csv(instance_info_filename)
+
+    instance_name = df['instance_name'][0]
+    num_vehicles = int(df['num_vehicles'][0])
+    turn_radius = float(df['turn_radius'][0])
+    num_discretizations_1 = int(df['num_discretizations_1'][0])
+    num_discretizations_2 = int(df['num_discretizations_2'][0])
+    tmax = float(df['tmax'][0])
+
+    print('instance name: {}'.format(instance_name))
+
+    df = pd.read_csv(instance_name, usecols=['x', 'y'], dtype=np.float64)
+    x_coords = df['x'].to_numpy()
+    y_coords = df['y'].to_numpy()
+    target_coordinates = df[['x', 'y']].to_numpy()
+
+    # plt.rc('font', family='sans-serif')
+    ## for Palatino and other serif fonts use:
+    plt.rc('font',**{'family':'serif','serif':['Palatino']})
+    plt.rc('text', usetex=True)
+
+    fig, ax = plt.subplots(1, 2)
+    plt.subplots_adjust(wspace=0.3, hspace=0.3)
+
+    vehicles = list(range(1, num_vehicles+1)) 
+    colors = ['chocolate', 'crimson', 'dimgray', 'orange']
+    linestyles = ['solid', 'dotted', 'dashed', 'dashdot']
+
+    # sampling the dubins paths is the expensive part, so it is done in worker processes
+    # and only the drawing happens here
+    tasks = []
+    for k, num_discretizations in enumerate([num_discretizations_1, num_discretizations_2]):
+        vertices = build_vertices(target_coordinates, num_discretizations)
+        tasks += [(i, k + 1, vertices, turn_radius) for i in vehicles]
+    with multiprocessing.Pool() as pool:
+        paths = pool.map(compute_vehicle_path, tasks)
+    vehicle_paths = [paths[:num_vehicles], paths[num_vehicles:]]
+
+    # each subplot draws all vehicle paths as a single collection, so the legend
+    # gets one proxy line per vehicle
+    vehicle_handles = [Line2D([], [], color='black', linewidth=0.6, linestyle=linestyles[i-1],
+                              label=r'vehicle '+ str(i) + ' path') for i in vehicles]
+
+    ax[0].add_collection(LineCollection([np.column_stack(path) for path in vehicle_paths[0]],
+                                         colors='black', linewidths=0.6,
+                                         linestyles=linestyles[:num_vehicles]))
+    ax[0].autoscale_view()
+
+    ax[0].tick_params(axis="x", direction="in", labelsize=8)
+    ax[0].tick_params(axis="y", direction="in", labelsize=8)
+    ax[0].plot(x_coords[1:-1], y_coords[1:-1], 'r.', markersize=3, label=r'target')
+    ax[0].plot(x_coords[0], y_coords[0], 'b*', markersize=4, label=r'source')
+    ax[0].plot(x_coords[-1], y_coords[-1], 'gx', markersize=4, label=r'destination')
+    ax[0].legend(handles=vehicle_handles + ax[0].get_legend_handles_labels()[0], fontsize=8)
+    ax[0].set_title(r'$|\Theta| = 6$', fontsize=10)
+
+    ax[1].add_collection(LineCollection([np.column_stack(path) for path in vehicle_paths[1]],
+                                         colors='black', linewidths=0.6,
+                                         linestyles=linestyles[:num_vehicles]))
+    ax[1].autoscale_view()
+
+    ax[1].tick_params(axis="x", direction="in", labelsize=8)
+    ax[1].tick_params(axis="y", direction="in", labelsize=8)
+    ax[1].plot(x_coords[1:-1], y_coords[1:-1], 'r.', markersize=3, label=r'target')
+    ax[1].plot(x_coords[0], y_coords[0], 'b*', markersize=4, label=r'source')
+    ax[1].plot(x_coords[-1], y_coords[-1], 'gx', markersize=4, label=r'destination')
+    ax[1].legend(handles=vehicle_handles + ax[1].get_legend_handles_labels()[0], fontsize=8)
+    ax[1].set_title(r'$|\Theta| = 2$', fontsize=10)
+
+
+    plt.savefig('illustration.pdf', format='pdf', bbox_inches='tight')
+
+
+if __name__ == '__main__':
+    main()
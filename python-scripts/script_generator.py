@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
 import csv
+import functools
 import logging
 import os
+import re
 import shutil
 import subprocess
 
 
 log = logging.getLogger(__name__)
 
+# resolved once at import, Config instances only copy them
+SCRIPT_FOLDER_PATH = os.path.dirname(os.path.realpath(__file__))
+BASE_PATH = os.path.abspath(os.path.join(SCRIPT_FOLDER_PATH, '..'))
+USER_GRADLE_PROPERTIES_PATH = os.path.join(
+    os.path.expanduser("~"), ".gradle", "gradle.properties")
+
+# base command, instance name, instance folder, case number, result file
+# extension and number of discretizations of one line in a runs file
+RUN_LINE_FORMAT = '%s -n %s -p ./data/%s -o ./results/results_%d.%s -d %s'
+
 
 class ScriptException(Exception):
     """Custom exception class with message for this module."""
@@ -26,9 +39,8 @@ class Config(object):
     """Class that holds global parameters."""
 
     def __init__(self):
-        self.script_folder_path = os.path.dirname(os.path.realpath(__file__))
-        self.base_path = os.path.abspath(
-            os.path.join(self.script_folder_path, '..'))
+        self.script_folder_path = SCRIPT_FOLDER_PATH
+        self.base_path = BASE_PATH
         self.cplex_lib_path = guess_cplex_library_path()
         self.data_path = os.path.join(self.base_path, 'data')
         self.jar_path = os.path.join(
@@ -41,26 +53,80 @@ class Config(object):
                                                "final-results",
                                                "instances.csv")
 
+        # Instance folders with any of these substrings in their names are
+        # left out of exhaustive runs.
+        self.exhaustive_excludes = ['_100_', '_102_']
+
+        # extension of result files, the solver writes JSON for "json" and
+        # YAML for "yaml"
+        self.result_file_extension = 'yaml'
+
+        # rebuild the uberjar even if it is newer than all build inputs
+        self.rebuild_jar = False
+
         self.dominance_runs = False
         self.exhaustive_runs = False
         self.simple_search_runs = False
         self.single_thread_runs = False
 
 
+def read_user_gradle_property(key):
+    """Return value of key in the user gradle.properties, None if absent."""
+    try:
+        with open(USER_GRADLE_PROPERTIES_PATH, 'r') as fin:
+            for line in fin:
+                line = line.strip()
+                if line.startswith(key + '='):
+                    return line.split('=')[-1].strip()
+    except OSError:
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize=1)
 def guess_cplex_library_path():
-    gp_path = os.path.join(os.path.expanduser(
-        "~"), ".gradle", "gradle.properties")
+    gp_path = USER_GRADLE_PROPERTIES_PATH
     if not os.path.isfile(gp_path):
         raise ScriptException(
             "gradle.properties not available at {}".format(gp_path))
 
-    with open(gp_path, 'r') as fin:
-        for line in fin:
-            line = line.strip()
-            if line.startswith('cplexLibPath='):
-                return line.split('=')[-1].strip()
+    cplex_lib_path = read_user_gradle_property('cplexLibPath')
+    if cplex_lib_path is None:
+        raise ScriptException("unable to read value of cplexLibPath ")
+    return cplex_lib_path
 
-    raise ScriptException("unable to read value of cplexLibPath ")
+
+def has_newer_entry(folder_path, mtime):
+    """Check if anything under folder_path was modified after mtime."""
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.stat(follow_symlinks=False).st_mtime > mtime:
+                return True
+            if (entry.is_dir(follow_symlinks=False) and
+                    has_newer_entry(entry.path, mtime)):
+                return True
+    return False
+
+
+def write_file(path, payload):
+    """Write bytes to path with raw os-level writes, skipping text I/O."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def link_or_copy(src, dst):
+    """Hard link src to dst, falling back to a copy across file systems."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
 
 
 class Controller:
@@ -71,11 +137,11 @@ class Controller:
         self._base_cmd = None
 
     def run(self):
-        self._base_cmd = [
+        self._base_cmd = (
             "java", "-Xms32m", "-Xmx32g",
             "-Djava.library.path={}".format(self.config.cplex_lib_path),
             "-jar", "./uber.jar",
-        ]
+        )
 
         self._prepare_uberjar()
 
@@ -106,27 +172,18 @@ class Controller:
         runs_file_path = os.path.join(
             self.config.script_folder_path, '{}_runs.txt'.format(test_name))
 
-        with open(runs_file_path, 'w') as f_out:
-            counter = 0
-            for folder_name, instance_name, num_disc in cases:
-                folder_path = './data/{}/'.format(folder_name)
-                cleaned_name = instance_name[:-4].replace('.', '_')
-                results_file_name = "results_{}.yaml".format(counter)
-
-                results_path = os.path.join("results", results_file_name)
-                results_path = "./{}".format(results_path)
-
-                cmd = [c for c in self._base_cmd]
-                cmd.extend([
-                    "-n", instance_name,
-                    "-p", folder_path,
-                    "-o", results_path,
-                    "-d", str(num_disc),
-                ])
-                cmd.extend(cmd_args)
-                f_out.write(' '.join(cmd))
-                f_out.write('\n')
-                counter += 1
+        base_cmd = ' '.join(self._base_cmd)
+        extra_args = ' '.join(cmd_args)
+        extension = self.config.result_file_extension
+        line_format = RUN_LINE_FORMAT + ' %s'
+        lines = []
+        for counter, (folder_name, instance_name, num_disc, _) in enumerate(
+                cases):
+            lines.append(line_format % (
+                base_cmd, instance_name, folder_name + '/', counter, extension,
+                num_disc, extra_args))
+
+        write_file(runs_file_path, ('\n'.join(lines) + '\n').encode())
 
         log.info("wrote cases to {}".format(runs_file_path))
         self._prepare_test_folder(
@@ -137,54 +194,64 @@ class Controller:
         runs_file_path = os.path.join(
             self.config.script_folder_path, 'exhaustive_runs.txt')
 
-        with open(runs_file_path, 'w') as f_out:
-            counter = 0
-            for folder, file_name, num_disc in cases:
-                results_file_name = "results_{}.yaml".format(counter)
-                results_path = os.path.join("results", results_file_name)
-                results_path = "./{}".format(results_path)
-
-                cmd = [c for c in self._base_cmd]
-                cmd.extend([
-                    "-n", file_name,
-                    "-p", "./data/{}".format(folder),
-                    "-o", results_path,
-                    "-d", str(num_disc),
-                    "-i", "1", ])
+        base_cmd = ' '.join(self._base_cmd)
+        extension = self.config.result_file_extension
+        lines = []
+        line_format = RUN_LINE_FORMAT + ' -i 1'
+        test_files = set()
+        for counter, (folder, file_name, num_disc, src_path) in enumerate(
+                cases):
+            test_files.add((folder, file_name, src_path))
+            lines.append(line_format % (
+                base_cmd, file_name, folder, counter, extension, num_disc))
+
+        if not lines:
+            raise ScriptException("no cases found for exhaustive runs")
 
-                f_out.write(' '.join(cmd))
-                f_out.write('\n')
-                counter += 1
+        write_file(runs_file_path, ('\n'.join(lines) + '\n').encode())
 
         log.info("wrote cases to {}".format(runs_file_path))
-        self._prepare_test_folder(
-            "exhaustive", self._get_folder_and_file_names(cases))
+        self._prepare_test_folder("exhaustive", test_files)
 
     def _collect_exhaustive_cases(self):
-        cases = []
-        for folder in os.listdir(self.config.data_path):
-            if '_100_' in folder or '_102_' in folder:
-                continue
-
-            for f in os.listdir(os.path.join(self.config.data_path, folder)):
-                if f.endswith(".txt"):
-                    for num_disc in ["2", "4", "6"]:
-                        cases.append((folder, f, num_disc))
-
-        if not cases:
-            raise ScriptException("no cases found for exhaustive runs")
-
-        return cases
+        # Cases are yielded as they are found, and carry the full source path
+        # of their instance file so that test folders can be filled without
+        # resolving it again.
+        discretizations = ("2", "4", "6")
+        excludes = self.config.exhaustive_excludes
+        exclude_pattern = (re.compile('|'.join(map(re.escape, excludes)))
+                           if excludes else None)
+        # scandir entries carry the file type from readdir, so no extra stat
+        # calls are needed to tell instance files and folders apart
+        with os.scandir(self.config.data_path) as folders:
+            for folder in folders:
+                if exclude_pattern and exclude_pattern.search(folder.name):
+                    continue
+                if not folder.is_dir(follow_symlinks=False):
+                    continue
+
+                folder_name = folder.name
+                with os.scandir(folder.path) as files:
+                    for f in files:
+                        if (f.name.endswith(".txt") and
+                                f.is_file(follow_symlinks=False)):
+                            for num_disc in discretizations:
+                                yield folder_name, f.name, num_disc, f.path
 
     def _collect_cases_from_file(self):
-        cases = []
+        data_path = self.config.data_path
         with open(self.config.instance_file_path, 'r', newline='') as csvfile:
             reader = csv.reader(csvfile)
             next(reader)  # skip header row
+            cases = []
             for row in reader:
-                folder_name = row[0].replace('./data/', '')
+                # instance paths look like "./data/<folder_name>/"
+                folder_name = row[0]
+                if folder_name.startswith('./data/'):
+                    folder_name = folder_name[len('./data/'):]
                 folder_name = folder_name[:-1]
-                cases.append((folder_name, row[1], int(row[2])))
+                cases.append((folder_name, row[1], int(row[2]),
+                              os.path.join(data_path, folder_name, row[1])))
 
         if not cases:
             raise ScriptException('no instances found in csv file')
@@ -192,18 +259,51 @@ class Controller:
         return cases
 
     def _get_folder_and_file_names(self, cases):
-        return list(set([(c[0], c[1]) for c in cases]))
+        return {(c[0], c[1], c[3]) for c in cases}
 
     def _prepare_uberjar(self):
         os.chdir(self.config.base_path)
-        subprocess.check_call(['gradle', 'clean', 'cleanlogs', 'uberjar'])
+        if not self.config.rebuild_jar and self._uberjar_is_current():
+            # the full build below also clears old solver logs, keep doing so
+            subprocess.check_call(['gradle', '--daemon', 'cleanlogs'])
+            log.info("uberjar up-to-date, skipping build")
+            return
+
+        # a warm daemon skips the JVM startup of the gradle client on reruns
+        subprocess.check_call(
+            ['gradle', '--daemon', 'clean', 'cleanlogs', 'uberjar'])
         if not os.path.isfile(self.config.jar_path):
             raise ScriptException("uberjar build failed")
         log.info("prepared uberjar")
 
+    def _uberjar_is_current(self):
+        try:
+            jar_mtime = os.path.getmtime(self.config.jar_path)
+        except OSError:
+            return False
+
+        build_inputs = [os.path.join(self.config.base_path, f) for f in [
+            'build.gradle.kts', 'settings.gradle.kts', 'gradle.properties']]
+
+        # user properties and the CPLEX jar they point to are build inputs too
+        build_inputs.append(USER_GRADLE_PROPERTIES_PATH)
+        cplex_jar_path = read_user_gradle_property('cplexJarPath')
+        if cplex_jar_path:
+            build_inputs.append(os.path.expanduser(cplex_jar_path))
+
+        for path in build_inputs:
+            if os.path.isfile(path) and os.path.getmtime(path) > jar_mtime:
+                return False
+
+        src_path = os.path.join(self.config.base_path, 'src')
+        return (os.path.isdir(src_path) and
+                not has_newer_entry(src_path, jar_mtime))
+
     def _prepare_test_folder(self, test_name, cases):
         rt_path = os.path.join(self.config.base_path, test_name)
         os.makedirs(rt_path, exist_ok=True)
+        # a copy, not a link, so that rebuilding the jar leaves test folders
+        # with the jar their runs were generated for
         shutil.copy(self.config.jar_path, os.path.join(rt_path, 'uber.jar'))
         runs_file_name = '{}_runs.txt'.format(test_name)
         for f in [runs_file_name, 'submit-batch.sh', 'slurm-batch-job.sh']:
@@ -216,15 +316,26 @@ class Controller:
 
         test_data_path = os.path.join(rt_path, 'data')
         os.makedirs(test_data_path, exist_ok=True)
-        for folder_name, file_name, in cases:
-            folder_path = os.path.join(test_data_path, folder_name)
-            os.makedirs(folder_path, exist_ok=True)
-            src = os.path.join(self.config.data_path, folder_name, file_name)
-            dst = os.path.join(folder_path, file_name)
-            log.info("src: {}".format(src))
-            log.info("dst: {}".format(dst))
-            shutil.copy(src, dst)
-            log.info("copied {}, {}".format(folder_name, file_name))
+
+        # copies are I/O bound, so threads let them overlap. Each destination
+        # folder is created the first time one of its files comes up.
+        num_workers = min(32, (os.cpu_count() or 1) * 4)
+        created_folders = set()
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+            futures = []
+            for folder_name, file_name, src in cases:
+                folder_path = os.path.join(test_data_path, folder_name)
+                if folder_path not in created_folders:
+                    os.makedirs(folder_path, exist_ok=True)
+                    created_folders.add(folder_path)
+                dst = os.path.join(folder_path, file_name)
+                log.debug("copying %s to %s", src, dst)
+                futures.append(executor.submit(link_or_copy, src, dst))
+
+            for future in futures:
+                future.result()
+        log.info("copied {} instance files to {}".format(
+            len(futures), test_data_path))
 
         for name in ['output', 'results']:
             folder_path = os.path.join(rt_path, name)
@@ -235,12 +346,16 @@ class Controller:
 def handle_command_line():
     parser = argparse.ArgumentParser()
 
+    parser.add_argument("-b", "--rebuild", action="store_true",
+                        help="rebuild the uberjar even if it is up-to-date")
     parser.add_argument("-d", "--dominance", action="store_true",
                         help="generate runs file for dominance comparison")
     parser.add_argument("-e", "--exhaustive", action="store_true",
                         help="generate runs file for testing all instances")
     parser.add_argument("-i", "--instancefilepath", type=str,
                         help="path to csv file with instances to run")
+    parser.add_argument("--json", action="store_true",
+                        help="have the solver write results as JSON")
     parser.add_argument("-s", "--simple", action="store_true",
                         help="generate runs file for simple search")
     parser.add_argument("-t", "--threading", action="store_true",
@@ -249,8 +364,11 @@ def handle_command_line():
     args = parser.parse_args()
     config = Config()
 
+    config.rebuild_jar = args.rebuild
     config.dominance_runs = args.dominance
     config.exhaustive_runs = args.exhaustive
+    if args.json:
+        config.result_file_extension = 'json'
     config.simple_search_runs = args.simple
     config.single_thread_runs = args.threading
     if args.instancefilepath:
@@ -261,7 +379,7 @@ def handle_command_line():
 
 def main():
     logging.basicConfig(format='%(asctime)s %(levelname)s--: %(message)s',
-                        level=logging.DEBUG)
+                        level=logging.INFO)
 
     try:
         config = handle_command_line()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+import update_db
+
+
+class ResultValuesTest(unittest.TestCase):
+    """Result files in either format must load to the same stored text."""
+
+    def _load(self, file_name, payload):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, file_name)
+            with open(path, "w") as fout:
+                fout.write(payload)
+            return update_db._load_result_values(
+                ["budget", "root_gap_percentage"], path)
+
+    def test_nan_gap_matches_across_formats(self):
+        yaml_values = self._load(
+            "results_0.yaml",
+            "---\nbudget: 7.5\nroot_gap_percentage: .NaN\n")
+        json_values = self._load(
+            "results_0.json",
+            '{"budget":7.5,"root_gap_percentage":"NaN"}')
+        self.assertEqual(yaml_values, ("7.5", "nan"))
+        self.assertEqual(json_values, yaml_values)
+
+
+if __name__ == '__main__':
+    unittest.main()
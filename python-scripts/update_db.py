@@ -1,25 +1,49 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
+import itertools
+import json
 import logging
-import operator
+import multiprocessing
 import os
 import sqlite3
 import subprocess
 import yaml
 
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
 log = logging.getLogger(__name__)
 
+# resolved once at import, Config instances only copy it
+BASE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+# the solver writes JSON results when its output path ends with .json,
+# which is much cheaper to parse than YAML
+RESULT_FILE_EXTENSIONS = (".json", ".yaml")
+
+# bound on ? parameters in one statement for sqlite builds older than 3.32
+SQLITE_MAX_VARIABLES = 999
+
+# text of non-finite numbers as quoted by the solver's JSON writer, mapped to
+# the text of the floats YAML result files load them as
+NON_FINITE_TEXT = {"NaN": "nan", "Infinity": "inf", "-Infinity": "-inf"}
+
 
 class Config(object):
     """Class that holds global parameters."""
 
     def __init__(self):
-        folder_path = os.path.dirname(os.path.realpath(__file__))
-        self.base_path = os.path.abspath(os.path.join(folder_path, '..'))
+        self.base_path = BASE_PATH
         self.results_path = os.path.join(self.base_path, 'results')
         self.db_path = os.path.join(self.base_path, 'final-results', 'results.db')
         self.table_name = 'search_comparison'
+        self.insert_batch_size = 500
+        self.num_workers = None  # processes used to parse result files, all cores if None
 
 
 class ScriptException(Exception):
@@ -40,75 +64,144 @@ class Controller:
         self.config = config
         self._connection = None  # will point to a connection to a SQL database
         self._cursor = None
+        self._column_names = None  # sorted keys of the first result file
+        self._rows_per_insert = None  # rows inserted by each multi-row INSERT
+        self._insert_sql = None
+        self._pending_rows = []
 
     def run(self):
-        self._connection = sqlite3.connect(self.config.db_path)
+        # transactions are managed explicitly instead of by the sqlite3 module
+        self._connection = sqlite3.connect(self.config.db_path,
+                                           isolation_level=None)
         self._cursor = self._connection.cursor()
-
-        if not self._table_exists():
-            self._create_table()
-
-        for f in os.listdir(self.config.results_path):
-            if f.endswith(".yaml"):
-                fpath = os.path.join(self.config.results_path, f)
-                self._add_results_to_table(fpath)
+        # journal_mode is left alone, since WAL would persist in the tracked
+        # db file and the load is a single transaction anyway
+        self._cursor.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-65536;""")
+
+        result_files = list(_iter_result_files(self.config.results_path))
+        if not result_files:
+            raise ScriptException(f"no result file found in results folder")
+        file_names, file_paths = zip(*result_files)
+
+        # every result file has the same keys, so they are sorted only once,
+        # from the first file, which is then inserted without parsing it again
+        first_result = _read_result_file(file_paths[0])
+        self._column_names = sorted(first_result.keys())
+
+        # create the table and insert all results in one transaction, so that
+        # only one commit hits the disk
+        self._cursor.execute("BEGIN IMMEDIATE")
+        self._create_table()
+        self._rows_per_insert = max(
+            1, SQLITE_MAX_VARIABLES // len(self._column_names))
+        self._insert_sql = self._build_insert_sql(self._rows_per_insert)
+
+        self._add_results_to_table(
+            _result_values(first_result, self._column_names))
+        log.info(f"added results for {file_names[0]}")
+
+        load_values = functools.partial(_load_result_values, self._column_names)
+        with multiprocessing.Pool(self.config.num_workers) as pool:
+            results = pool.imap(load_values, file_paths[1:], chunksize=16)
+            for f, values in zip(file_names[1:], results):
+                self._add_results_to_table(values)
                 log.info(f"added results for {f}")
+                if len(self._pending_rows) >= self.config.insert_batch_size:
+                    self._flush_pending_rows()
 
-        self._connection.commit()
+        self._flush_pending_rows()
+        self._cursor.execute("COMMIT")
         self._cursor.close()
         self._connection.close()
         log.info("result addition completed")
 
-    def _table_exists(self):
-        cmd = f"""
-            SELECT count(name)
-            FROM sqlite_master
-            WHERE type='table'
-            AND name='{self.config.table_name}'"""
-        self._cursor.execute(cmd)
-        return self._cursor.fetchone()[0] == 1
-
     def _create_table(self):
-        for f in os.listdir(self.config.results_path):
-            if not f.endswith(".yaml"):
-                continue
-
-            with open(os.path.join(self.config.results_path, f), 'r') as fin:
-                result_dict = yaml.load(fin, Loader=yaml.FullLoader)
-                column_names = sorted(list(result_dict.keys()))
-                self._cursor.execute(
-                    f"""
-                    CREATE TABLE
-                    {self.config.table_name}
-                    ({",".join(column_names)})""")
-
-            return
-
-        raise ScriptException(f"no yaml file found in results folder")
-
-    @staticmethod
-    def _build_create_table_command(name, num_columns):
-        cmd_list = [f'CREATE TABLE {name}', '(']
-        for _ in range(num_columns - 1):
-            cmd_list.append('?,')
-        cmd_list.append('?)')
-        return ''.join(cmd_list)
-
-    def _add_results_to_table(self, fpath):
-        with open(fpath, "r") as f_result:
-            result_dict = yaml.load(f_result, Loader=yaml.FullLoader)
-            keys_and_values = [(key, val)
-                               for (key, val) in result_dict.items()]
-            keys_and_values.sort(key=operator.itemgetter(0))
-            _, values = zip(*keys_and_values)
-            values = [f"'{v}'" for v in values]
-
-            cmd = f"""
-                INSERT INTO {self.config.table_name}
-                VALUES ({",".join(values)})"""
-            self._cursor.execute(cmd)
-            # self._cursor.execute(
-            #     f"""INSERT INTO results VALUES ({",".join(values)})""")
+        # all values are stored as text, so declare it instead of leaving
+        # the columns without a type
+        columns = ",".join(
+            f"{_quote_identifier(c)} TEXT" for c in self._column_names)
+        self._cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS
+            {_quote_identifier(self.config.table_name)}
+            ({columns})""")
+
+    def _add_results_to_table(self, values):
+        self._pending_rows.append(values)
+
+    def _build_insert_sql(self, num_rows):
+        row_placeholder = f'({",".join(["?"] * len(self._column_names))})'
+        columns = ",".join(_quote_identifier(c) for c in self._column_names)
+        return f"""
+            INSERT INTO {_quote_identifier(self.config.table_name)}
+            ({columns})
+            VALUES {",".join([row_placeholder] * num_rows)}"""
+
+    def _flush_pending_rows(self):
+        # full chunks of rows share one prepared multi-row INSERT, and the
+        # remainder gets a statement sized to it
+        rows = self._pending_rows
+        k = self._rows_per_insert
+        num_full = len(rows) - len(rows) % k
+        if num_full:
+            self._cursor.executemany(
+                self._insert_sql,
+                (tuple(itertools.chain.from_iterable(rows[i:i + k]))
+                 for i in range(0, num_full, k)))
+        if num_full < len(rows):
+            remainder = rows[num_full:]
+            self._cursor.execute(
+                self._build_insert_sql(len(remainder)),
+                tuple(itertools.chain.from_iterable(remainder)))
+        self._pending_rows = []
+
+
+def _quote_identifier(name):
+    """Quote a table or column name for SQL, doubling any quotes in it."""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _iter_result_files(folder_path):
+    """Yield names and paths of result files in a folder in a single scandir pass."""
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if (entry.name.endswith(RESULT_FILE_EXTENSIONS) and
+                    entry.is_file()):
+                yield entry.name, entry.path
+
+
+def _load_result_values(column_names, fpath):
+    """Parse a results file into its values, ordered as column_names.
+
+    Runs in worker processes, so it must stay a module-level function and
+    must not touch the database.
+    """
+    return _result_values(_read_result_file(fpath), column_names)
+
+
+def _result_values(result_dict, column_names):
+    # values are stored as text, as queries on result tables expect
+    return tuple(_value_text(result_dict[k]) for k in column_names)
+
+
+def _value_text(value):
+    """Text stored for a result value, the same for JSON and YAML files."""
+    text = str(value)
+    return NON_FINITE_TEXT.get(text, text)
+
+
+def _read_result_file(fpath):
+    """Parse a results file written by the solver in either JSON or YAML."""
+    # result files are small, so they are read in one call and the parsers
+    # work on the bytes instead of pulling from a buffered stream
+    with open(fpath, "rb") as f_result:
+        data = f_result.read()
+    if fpath.endswith(".json"):
+        return json.loads(data)
+    return yaml.load(data, Loader=_Loader)
 
 
 def handle_command_line():
@@ -118,6 +211,8 @@ def handle_command_line():
                         help="path to folder with results")
     parser.add_argument("-t", "--tablename", type=str,
                         help="name of table to add results to")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="number of processes used to parse result files")
 
     args = parser.parse_args()
     config = Config()
@@ -128,6 +223,9 @@ def handle_command_line():
     if args.tablename:
         config.table_name = args.tablename
 
+    if args.jobs:
+        config.num_workers = args.jobs
+
     return config
 
 
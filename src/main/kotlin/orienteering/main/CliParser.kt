@@ -48,8 +48,8 @@ class CliParser : CliktCommand() {
     )
         .default("./logs/results.yaml")
         .validate {
-            require(it.length > 5 && it.endsWith(".yaml")) {
-                "output path should end with a non-empty file name and .yaml extension"
+            require(it.length > 5 && (it.endsWith(".yaml") || it.endsWith(".json"))) {
+                "output path should end with a non-empty file name and .yaml or .json extension"
             }
         }
 
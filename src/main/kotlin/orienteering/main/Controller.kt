@@ -107,10 +107,11 @@ class Controller {
     }
 
     /**
-     * Function to dump the results in a YAML file
+     * Function to dump the results in a YAML or JSON file, based on the extension of [resultsPath]
      */
     fun writeResults() {
-        ObjectMapper(YAMLFactory()).writeValue(File(resultsPath), results)
+        val mapper = if (resultsPath.endsWith(".json")) ObjectMapper() else ObjectMapper(YAMLFactory())
+        mapper.writeValue(File(resultsPath), results)
     }
 
     /**